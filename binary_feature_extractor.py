@@ -14,12 +14,70 @@ Date: 2025-11-04
 import sqlite3
 import logging
 from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta
 import math
+from itertools import accumulate
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+# Default features when player has no history (conservative estimates),
+# in the same key order as the computed features. Home and away variants
+# are built once by overriding is_home in place; callers get a copy.
+_DEFAULT_FEATURES = {
+    'success_rate_season': 0.35,  # League average from verify_data.py
+    'success_rate_l20': 0.35,
+    'success_rate_l10': 0.35,
+    'success_rate_l5': 0.35,
+    'success_rate_l3': 0.35,
+    'current_streak': 0.0,
+    'max_hot_streak': 0.0,
+    'recent_momentum': 0.35,
+    'is_home': 0.0,
+    'games_played': 0.0,
+    'insufficient_data': 1.0  # FLAG: No historical data
+}
+_DEFAULT_FEATURES_BY_HOME = {
+    True: {**_DEFAULT_FEATURES, 'is_home': 1.0},
+    False: {**_DEFAULT_FEATURES, 'is_home': 0.0},
+}
+
+
+# Success-rate features and their windows (None = whole season), in
+# feature order
+_SUCCESS_RATE_WINDOWS = (
+    ('success_rate_season', None),
+    ('success_rate_l20', 20),
+    ('success_rate_l10', 10),
+    ('success_rate_l5', 5),
+    ('success_rate_l3', 3),
+)
+
+
+# Player history before a cutoff date - only the columns the features read
+_HISTORY_SQL = """
+    SELECT 
+        game_date,
+        scored_1plus_points
+    FROM player_game_logs
+    WHERE player_name = ?
+        AND team = ?
+        AND game_date < ?
+    ORDER BY game_date DESC
+"""
+
+
+def _momentum_weights(n: int) -> Tuple[float, ...]:
+    """Normalized exponential weights for n games (most recent first)"""
+    weights = [math.exp(-i / 3.0) for i in range(n)]
+    weights_sum = sum(weights)
+    return tuple(w / weights_sum for w in weights)
+
+
+# Momentum uses the last 10 games; the weights only depend on how many of
+# those a player has, so every length is computed once at import
+_MOMENTUM_WINDOW = 10
+_MOMENTUM_WEIGHTS = tuple(_momentum_weights(n) for n in range(_MOMENTUM_WINDOW + 1))
+
 
 class BinaryFeatureExtractor:
     """
@@ -38,11 +96,18 @@ class BinaryFeatureExtractor:
         """
         self.db_path = db_path
         self.conn = None
+        self._cursor = None
         
     def connect(self):
         """Open database connection"""
         self.conn = sqlite3.connect(self.db_path)
         self.conn.row_factory = sqlite3.Row  # Access columns by name
+        # The extractor only reads: refuse writes, keep sort b-trees in memory
+        self.conn.execute('PRAGMA query_only=1')
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        # One cursor and one SQL string for every history query, so
+        # sqlite3's statement cache hands back the compiled statement
+        self._cursor = self.conn.cursor()
         
     def close(self):
         """Close database connection"""
@@ -54,7 +119,8 @@ class BinaryFeatureExtractor:
                         team: str, 
                         game_date: str, 
                         opponent: str,
-                        is_home: bool) -> Dict[str, float]:
+                        is_home: bool,
+                        games: Optional[list] = None) -> Dict[str, float]:
         """
         Extract binary features for a player's game.
         
@@ -64,51 +130,55 @@ class BinaryFeatureExtractor:
             game_date: Game date (YYYY-MM-DD) - PREDICTION DATE
             opponent: Opponent team abbreviation
             is_home: True if home game, False if away
+            games: Optional prefetched history (most recent first, games
+                before game_date) so callers can share one query between
+                extractors; fetched here when None
             
         Returns:
-            Dictionary of features (all floats)
+            Dictionary of features (all floats). Never None - players with
+            no history get the default features (insufficient_data = 1.0,
+            games_played = 0.0), so every call returns the same schema.
             
         Note:
             Uses ONLY data from BEFORE game_date (temporal safety)
         """
-        if not self.conn:
-            self.connect()
-            
         # Get player's historical games (BEFORE game_date)
-        games = self._get_player_history(player_name, team, game_date)
+        if games is None:
+            if not self.conn:
+                self.connect()
+            games = self._get_player_history(player_name, team, game_date)
         
         if not games:
             logger.warning(f"No history for {player_name} before {game_date}")
             return self._get_default_features(is_home)
+        
+        # VALIDATE TEMPORAL SAFETY - before any feature is computed
+        is_safe, violation_date = self._validate_temporal_safety(games, game_date)
+        if not is_safe:
+            logger.error(f"TEMPORAL VIOLATION: Used data from {violation_date} >= {game_date}")
+            raise ValueError("Data leakage detected!")
             
         # Extract features
         features = {}
         
+        # 1+ point outcomes (most recent first) - built once, shared by all features
+        scored = [g['scored_1plus_points'] for g in games]
+        
         # SUCCESS RATES (5 features)
-        features['success_rate_season'] = self._calc_success_rate(games, window=None)
-        features['success_rate_l20'] = self._calc_success_rate(games, window=20)
-        features['success_rate_l10'] = self._calc_success_rate(games, window=10)
-        features['success_rate_l5'] = self._calc_success_rate(games, window=5)
-        features['success_rate_l3'] = self._calc_success_rate(games, window=3)
+        features.update(self._calc_success_rates(scored))
         
         # STREAKS (2 features)
-        features['current_streak'] = self._calc_current_streak(games)
-        features['max_hot_streak'] = self._calc_max_hot_streak(games)
+        features['current_streak'] = self._calc_current_streak(scored)
+        features['max_hot_streak'] = self._calc_max_hot_streak(scored)
         
         # MOMENTUM (1 feature)
-        features['recent_momentum'] = self._calc_momentum(games)
+        features['recent_momentum'] = self._calc_momentum(scored)
         
         # CONTEXT (3 features)
-        features['is_home'] = 1.0 if is_home else 0.0
+        features['is_home'] = float(bool(is_home))
         features['games_played'] = float(len(games))
-        features['insufficient_data'] = 1.0 if len(games) < 5 else 0.0
+        features['insufficient_data'] = float(len(games) < 5)
         
-        # VALIDATE TEMPORAL SAFETY
-        is_safe, violation_date = self._validate_temporal_safety(games, game_date)
-        if not is_safe:
-            logger.error(f"TEMPORAL VIOLATION: Used data from {violation_date} >= {game_date}")
-            raise ValueError("Data leakage detected!")
-            
         return features
         
     def _get_player_history(self, 
@@ -124,61 +194,44 @@ class BinaryFeatureExtractor:
             cutoff_date: Don't include games on or after this date
             
         Returns:
-            List of game dictionaries (most recent first)
+            List of game rows (most recent first), keyed by column name
         """
-        cursor = self.conn.cursor()
-        
-        query = """
-            SELECT 
-                game_date,
-                scored_1plus_points,
-                points,
-                is_home
-            FROM player_game_logs
-            WHERE player_name = ?
-                AND team = ?
-                AND game_date < ?
-            ORDER BY game_date DESC
-        """
-        
-        cursor.execute(query, (player_name, team, cutoff_date))
-        games = [dict(row) for row in cursor.fetchall()]
-        
-        return games
+        # sqlite3.Row already supports game['column'], so the rows are
+        # returned without a dict copy each
+        self._cursor.execute(_HISTORY_SQL, (player_name, team, cutoff_date))
+        return self._cursor.fetchall()
         
-    def _calc_success_rate(self, games: list, window: Optional[int] = None) -> float:
+    def _calc_success_rates(self, scored: list) -> Dict[str, float]:
         """
-        Calculate success rate (% of games with 1+ points).
+        Calculate success rates (% of games with 1+ points) for every window.
+        
+        One running sum over the outcomes serves all windows: the hits in
+        the last w games are running[w - 1].
         
         Args:
-            games: List of game dictionaries
-            window: Number of recent games (None = all games)
+            scored: List of 0/1 outcomes (most recent first)
             
         Returns:
-            Success rate (0.0 to 1.0)
+            Dict of success_rate_* features (0.0 to 1.0)
         """
-        if not games:
-            return 0.5  # Default: 50% if no data
+        if not scored:
+            # Default: 50% if no data
+            return {key: 0.5 for key, _ in _SUCCESS_RATE_WINDOWS}
             
-        # Apply window
-        if window:
-            games_subset = games[:window]
-        else:
-            games_subset = games
-            
-        if not games_subset:
-            return 0.5
-            
-        # Calculate success rate
-        successes = sum(1 for g in games_subset if g['scored_1plus_points'] == 1)
-        return successes / len(games_subset)
-        
-    def _calc_current_streak(self, games: list) -> float:
+        running = list(accumulate(scored))
+        rates = {}
+        for key, window in _SUCCESS_RATE_WINDOWS:
+            # Windows longer than the history use every game (None = all games)
+            n = min(window or len(scored), len(scored))
+            rates[key] = running[n - 1] / n
+        return rates
+        
+    def _calc_current_streak(self, scored: list) -> float:
         """
         Calculate current streak (positive = hot, negative = cold).
         
         Args:
-            games: List of game dictionaries (most recent first)
+            scored: List of 0/1 outcomes (most recent first)
             
         Returns:
             Streak length (positive for scoring streak, negative for cold streak)
@@ -187,17 +240,17 @@ class BinaryFeatureExtractor:
             [1, 1, 1, 0] -> +3 (scored last 3 games)
             [0, 0, 1, 1] -> -2 (scoreless last 2 games)
         """
-        if not games:
+        if not scored:
             return 0.0
             
-        streak = 0
-        first_result = games[0]['scored_1plus_points']
-        
-        for game in games:
-            if game['scored_1plus_points'] == first_result:
-                streak += 1
-            else:
-                break
+        first_result = scored[0]
+        
+        # The streak ends at the first opposite 0/1 outcome (list.index
+        # scans in C); no opposite outcome means the whole history
+        try:
+            streak = scored.index(1 - first_result)
+        except ValueError:
+            streak = len(scored)
                 
         # Make negative if cold streak
         if first_result == 0:
@@ -205,59 +258,48 @@ class BinaryFeatureExtractor:
             
         return float(streak)
         
-    def _calc_max_hot_streak(self, games: list) -> float:
+    def _calc_max_hot_streak(self, scored: list) -> float:
         """
         Calculate longest scoring streak this season.
         
         Args:
-            games: List of game dictionaries
+            scored: List of 0/1 outcomes
             
         Returns:
             Max consecutive games with 1+ points
         """
-        if not games:
+        if not scored:
             return 0.0
             
-        max_streak = 0
-        current_streak = 0
+        # Outcomes are 0/1: as bytes, the scoring runs are the pieces between
+        # the zero bytes, so the split and the lengths run in C
+        return float(max(map(len, bytes(scored).split(b'\x00'))))
         
-        for game in games:
-            if game['scored_1plus_points'] == 1:
-                current_streak += 1
-                max_streak = max(max_streak, current_streak)
-            else:
-                current_streak = 0
-                
-        return float(max_streak)
-        
-    def _calc_momentum(self, games: list) -> float:
+    def _calc_momentum(self, scored: list) -> float:
         """
         Calculate momentum (weighted toward recent games).
         
         Uses exponential weighting: recent games count more.
         
         Args:
-            games: List of game dictionaries (most recent first)
+            scored: List of 0/1 outcomes (most recent first)
             
         Returns:
             Momentum score (0.0 to 1.0)
         """
-        if not games:
+        if not scored:
             return 0.5
             
         # Use last 10 games for momentum
-        recent_games = games[:10]
+        outcomes = scored[:_MOMENTUM_WINDOW]
         
-        if not recent_games:
+        if not outcomes:
             return 0.5
             
         # Exponential weights (most recent = highest weight)
-        weights = [math.exp(-i / 3.0) for i in range(len(recent_games))]
-        weights_sum = sum(weights)
-        weights = [w / weights_sum for w in weights]  # Normalize
+        weights = _MOMENTUM_WEIGHTS[len(outcomes)]
 
         # Weighted average of successes
-        outcomes = [g['scored_1plus_points'] for g in recent_games]
         momentum = sum(o * w for o, w in zip(outcomes, weights))
 
         return float(momentum)
@@ -277,11 +319,10 @@ class BinaryFeatureExtractor:
             - is_safe: True if all games before game_date
             - violation_date: First date >= game_date (if any)
         """
-        game_date_obj = datetime.strptime(game_date, '%Y-%m-%d')
-        
+        # YYYY-MM-DD strings sort chronologically - compare them directly
+        # instead of parsing every game's date
         for game in games:
-            game_date_check = datetime.strptime(game['game_date'], '%Y-%m-%d')
-            if game_date_check >= game_date_obj:
+            if game['game_date'] >= game_date:
                 return False, game['game_date']
                 
         return True, None
@@ -296,19 +337,8 @@ class BinaryFeatureExtractor:
         Returns:
             Dictionary of default features (conservative estimates)
         """
-        return {
-            'success_rate_season': 0.35,  # League average from verify_data.py
-            'success_rate_l20': 0.35,
-            'success_rate_l10': 0.35,
-            'success_rate_l5': 0.35,
-            'success_rate_l3': 0.35,
-            'current_streak': 0.0,
-            'max_hot_streak': 0.0,
-            'recent_momentum': 0.35,
-            'is_home': 1.0 if is_home else 0.0,
-            'games_played': 0.0,
-            'insufficient_data': 1.0  # FLAG: No historical data
-        }
+        # A copy - callers keep the dict with their prediction
+        return dict(_DEFAULT_FEATURES_BY_HOME[bool(is_home)])
 
 
 def test_feature_extraction():
@@ -5,6 +5,12 @@ Check if features_json is being saved in predictions table
 import sqlite3
 import json
 
+try:
+    # Faster C JSON parser when available; stdlib json otherwise
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
 def check_feature_storage():
     """Check if features are being stored"""
     conn = sqlite3.connect('database/nhl_predictions_v2.db')
@@ -38,7 +44,7 @@ def check_feature_storage():
         
         if features_json:
             try:
-                features = json.loads(features_json)
+                features = _json_loads(features_json)
                 feature_count = len(features)
                 print(f'   [OK] HAS {feature_count} FEATURES STORED')
                 print(f'   Sample features: {list(features.keys())[:5]}')
@@ -77,12 +83,15 @@ def check_feature_storage():
         print('   Older predictions won\'t have features, but new ones will.')
         print()
     
-    # Check total count
-    cursor.execute('SELECT COUNT(*) FROM predictions')
-    total = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM predictions WHERE features_json IS NOT NULL')
-    with_features = cursor.fetchone()[0]
+    # Check total count - both counts are answered from indexes (the NULL
+    # count from the partial idx_predictions_without_features
+    # built by setup_database_indexes.py)
+    cursor.execute('''
+        SELECT (SELECT COUNT(*) FROM predictions),
+               (SELECT COUNT(*) FROM predictions WHERE features_json IS NULL)
+    ''')
+    total, without_features = cursor.fetchone()
+    with_features = total - without_features
     
     print(f'Total predictions: {total}')
     print(f'With features: {with_features} ({with_features/total*100:.1f}%)')
@@ -26,16 +26,19 @@ def check_schema():
         
         required_columns = []
         optional_columns = []
+        schema_lines = []
         
         for col in columns:
             col_id, name, type_, notnull, default, pk = col
-            print(f"{name:<30} {type_:<15} {notnull:<8} {str(default):<15} {pk:<4}")
+            schema_lines.append(f"{name:<30} {type_:<15} {notnull:<8} {str(default):<15} {pk:<4}")
             
             if notnull and default is None and not pk:
                 required_columns.append((name, type_))
             else:
                 optional_columns.append((name, type_))
         
+        # One write for the whole table instead of a line-buffered flush per column
+        print("\n".join(schema_lines))
         print()
         print("="*80)
         print("COLUMN REQUIREMENTS")
@@ -86,15 +89,15 @@ def check_schema():
         print("="*80)
         print()
         
-        all_cols = [col[1] for col in cursor.execute("PRAGMA table_info(predictions)").fetchall()]
+        # Reuse the table_info rows from above - the connection is closed now
+        all_cols = [col[1] for col in columns]
         
         print("cursor.execute('''")
         print("    INSERT INTO predictions (")
         print("        " + ",\n        ".join(all_cols))
         print("    ) VALUES (" + ", ".join(["?"] * len(all_cols)) + ")")
         print("''', (")
-        for col in all_cols:
-            print(f"    {col},  # TODO: provide value")
+        print("\n".join(f"    {col},  # TODO: provide value" for col in all_cols))
         print("))")
         
         return required_columns
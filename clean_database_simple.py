@@ -7,6 +7,13 @@ These predictions are useless for ML training anyway.
 
 import sqlite3
 
+# (total predictions, predictions without features)
+_FEATURE_COUNTS_SQL = """
+    SELECT (SELECT COUNT(*) FROM predictions),
+           (SELECT COUNT(*) FROM predictions
+            WHERE features_json IS NULL OR features_json = '')
+"""
+
 def clean_database():
     """Remove predictions without features_json"""
     
@@ -19,21 +26,12 @@ def clean_database():
         conn = sqlite3.connect('database/nhl_predictions_v2.db')
         cursor = conn.cursor()
         
-        # Count before
-        cursor.execute("SELECT COUNT(*) FROM predictions")
-        total_before = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM predictions 
-            WHERE features_json IS NULL OR features_json = ''
-        """)
-        to_delete = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM predictions 
-            WHERE features_json IS NOT NULL AND features_json != ''
-        """)
-        to_keep = cursor.fetchone()[0]
+        # Count before - both counts are answered from indexes (the missing
+        # count from the partial idx_predictions_without_features
+        # built by setup_database_indexes.py)
+        cursor.execute(_FEATURE_COUNTS_SQL)
+        total_before, to_delete = cursor.fetchone()
+        to_keep = total_before - to_delete
         
         print(f"Current state:")
         print(f"  Total predictions: {total_before}")
@@ -53,7 +51,7 @@ def clean_database():
         
         response = input("Proceed with deletion? (yes/no): ").strip().lower()
         
-        if response not in ['yes', 'y']:
+        if response not in {'yes', 'y'}:
             print("CANCELLED - no changes made")
             conn.close()
             return
@@ -61,6 +59,9 @@ def clean_database():
         print()
         print("Deleting predictions without features...")
         
+        # Both deletes in one write transaction, write lock taken up front
+        cursor.execute("BEGIN IMMEDIATE")
+        
         # Delete predictions without features
         cursor.execute("""
             DELETE FROM predictions 
@@ -78,14 +79,9 @@ def clean_database():
         conn.commit()
         
         # Count after
-        cursor.execute("SELECT COUNT(*) FROM predictions")
-        total_after = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM predictions 
-            WHERE features_json IS NOT NULL AND features_json != ''
-        """)
-        with_features_after = cursor.fetchone()[0]
+        cursor.execute(_FEATURE_COUNTS_SQL)
+        total_after, missing_after = cursor.fetchone()
+        with_features_after = total_after - missing_after
         
         print()
         print("="*80)
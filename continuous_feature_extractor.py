@@ -19,12 +19,60 @@ Date: 2025-11-04
 import sqlite3
 import logging
 from typing import Dict, Optional, Tuple, List
-from datetime import datetime
 import math
+from itertools import accumulate
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+# Default features when player has no history, in computed-feature key order
+_LEAGUE_AVG_SOG = 2.5  # League average from verify_data
+_LEAGUE_STD_SOG = 1.2
+
+_DEFAULT_FEATURES = {
+    'sog_season': _LEAGUE_AVG_SOG,
+    'sog_l10': _LEAGUE_AVG_SOG,
+    'sog_l5': _LEAGUE_AVG_SOG,
+    'sog_std_season': _LEAGUE_STD_SOG,
+    'sog_std_l10': _LEAGUE_STD_SOG,
+    'sog_trend': 0.0,
+    'avg_toi_minutes': 15.0,
+    'is_home': 0.0,
+    'games_played': 0.0,
+    'insufficient_data': 1.0
+}
+_DEFAULT_FEATURES_BY_HOME = {
+    True: {**_DEFAULT_FEATURES, 'is_home': 1.0},
+    False: {**_DEFAULT_FEATURES, 'is_home': 0.0},
+}
+
+
+# Average and spread features and their windows (None = whole season),
+# in feature order
+_AVERAGE_WINDOWS = (
+    ('sog_season', None),
+    ('sog_l10', 10),
+    ('sog_l5', 5),
+)
+_STD_DEV_WINDOWS = (
+    ('sog_std_season', None),
+    ('sog_std_l10', 10),
+)
+
+# Player shot history before a cutoff date - only the columns the
+# features read
+_SHOT_HISTORY_SQL = """
+    SELECT 
+        game_date,
+        shots_on_goal,
+        toi_seconds
+    FROM player_game_logs
+    WHERE player_name = ?
+        AND team = ?
+        AND game_date < ?
+    ORDER BY game_date DESC
+"""
+
 
 class ContinuousFeatureExtractor:
     """
@@ -43,11 +91,15 @@ class ContinuousFeatureExtractor:
         """
         self.db_path = db_path
         self.conn = None
+        self._cursor = None
         
     def connect(self):
         """Open database connection"""
         self.conn = sqlite3.connect(self.db_path)
         self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA query_only=1')  # Read-only extractor
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self._cursor = self.conn.cursor()
         
     def close(self):
         """Close database connection"""
@@ -59,7 +111,8 @@ class ContinuousFeatureExtractor:
                         team: str,
                         game_date: str,
                         opponent: str,
-                        is_home: bool) -> Dict[str, float]:
+                        is_home: bool,
+                        games: Optional[List[Dict]] = None) -> Dict[str, float]:
         """
         Extract continuous features for a player's game.
         
@@ -69,52 +122,53 @@ class ContinuousFeatureExtractor:
             game_date: Game date (YYYY-MM-DD) - PREDICTION DATE
             opponent: Opponent team abbreviation
             is_home: True if home game, False if away
+            games: Optional prefetched history (most recent first, games
+                before game_date) so callers can share one query between
+                extractors; fetched here when None
             
         Returns:
-            Dictionary of features (all floats)
+            Dictionary of features (all floats). Never None - players with
+            no history get the default features (insufficient_data = 1.0,
+            games_played = 0.0), so every call returns the same schema.
             
         Note:
             Uses ONLY data from BEFORE game_date (temporal safety)
         """
-        if not self.conn:
-            self.connect()
-            
         # Get player's shot history (BEFORE game_date)
-        games = self._get_shot_history(player_name, team, game_date)
+        if games is None:
+            if not self.conn:
+                self.connect()
+            games = self._get_shot_history(player_name, team, game_date)
         
         if not games:
             logger.warning(f"No shot history for {player_name} before {game_date}")
             return self._get_default_features(is_home)
+        
+        # VALIDATE TEMPORAL SAFETY
+        is_safe, violation_date = self._validate_temporal_safety(games, game_date)
+        if not is_safe:
+            logger.error(f"TEMPORAL VIOLATION: Used data from {violation_date} >= {game_date}")
+            raise ValueError("Data leakage detected!")
             
         # Extract shot features
         features = {}
         
-        # AVERAGES (3 features)
-        features['sog_season'] = self._calc_average(games, window=None)
-        features['sog_l10'] = self._calc_average(games, window=10)
-        features['sog_l5'] = self._calc_average(games, window=5)
+        # Shot counts and ice times as columns (most recent first) - built
+        # once, so the feature math never goes back to the per-game rows
+        shots = [g['shots_on_goal'] for g in games]
+        toi = [g['toi_seconds'] for g in games]
         
-        # CONSISTENCY (2 features)
-        features['sog_std_season'] = self._calc_std_dev(games, window=None)
-        features['sog_std_l10'] = self._calc_std_dev(games, window=10)
-        
-        # TREND (1 feature)
-        features['sog_trend'] = self._calc_trend(games)
+        # AVERAGES (3 features) + CONSISTENCY (2 features) + TREND (1 feature)
+        features.update(self._calc_shot_stats(shots))
         
         # ICE TIME (1 feature) - if available
-        features['avg_toi_minutes'] = self._calc_avg_toi(games)
+        features['avg_toi_minutes'] = self._calc_avg_toi(toi)
         
         # CONTEXT (3 features)
-        features['is_home'] = 1.0 if is_home else 0.0
+        features['is_home'] = float(bool(is_home))
         features['games_played'] = float(len(games))
-        features['insufficient_data'] = 1.0 if len(games) < 5 else 0.0
+        features['insufficient_data'] = float(len(games) < 5)
         
-        # VALIDATE TEMPORAL SAFETY
-        is_safe, violation_date = self._validate_temporal_safety(games, game_date)
-        if not is_safe:
-            logger.error(f"TEMPORAL VIOLATION: Used data from {violation_date} >= {game_date}")
-            raise ValueError("Data leakage detected!")
-            
         return features
         
     def _get_shot_history(self,
@@ -130,84 +184,55 @@ class ContinuousFeatureExtractor:
             cutoff_date: Don't include games on or after this date
             
         Returns:
-            List of game dictionaries (most recent first)
+            List of game rows (most recent first), keyed by column name
         """
-        cursor = self.conn.cursor()
+        self._cursor.execute(_SHOT_HISTORY_SQL, (player_name, team, cutoff_date))
+        return self._cursor.fetchall()
         
-        query = """
-            SELECT 
-                game_date,
-                shots_on_goal,
-                toi_seconds,
-                is_home
-            FROM player_game_logs
-            WHERE player_name = ?
-                AND team = ?
-                AND game_date < ?
-            ORDER BY game_date DESC
+    def _calc_shot_stats(self, shots: List[int]) -> Dict[str, float]:
         """
+        Calculate average shots per game, their standard deviation
+        (consistency measure) for every window, and the shot trend.
         
-        cursor.execute(query, (player_name, team, cutoff_date))
-        games = [dict(row) for row in cursor.fetchall()]
-        
-        return games
-        
-    def _calc_average(self, games: List[Dict], window: Optional[int] = None) -> float:
-        """
-        Calculate average shots per game.
+        Running sums of the shots and of their squares (exact integers)
+        serve all windows: the last w games sum to running[w - 1].
         
         Args:
-            games: List of game dictionaries
-            window: Number of recent games (None = all games)
+            shots: List of shot counts (most recent first)
             
         Returns:
-            Average SOG per game
+            Dict of sog_* average, sog_std_* and sog_trend features
         """
-        if not games:
-            return 2.5  # League average default
-            
-        # Apply window
-        if window:
-            games_subset = games[:window]
-        else:
-            games_subset = games
-            
-        if not games_subset:
-            return 2.5
-            
-        shots = [g['shots_on_goal'] for g in games_subset]
-        return float(sum(shots) / len(shots))
-        
-    def _calc_std_dev(self, games: List[Dict], window: Optional[int] = None) -> float:
-        """
-        Calculate standard deviation of shots (consistency measure).
-        
-        Args:
-            games: List of game dictionaries
-            window: Number of recent games (None = all games)
-            
-        Returns:
-            Standard deviation of SOG
-        """
-        if not games:
-            return 1.2  # Default std dev
-            
-        # Apply window
-        if window:
-            games_subset = games[:window]
-        else:
-            games_subset = games
-            
-        if len(games_subset) < 2:
-            return 1.2
-
-        shots = [g['shots_on_goal'] for g in games_subset]
-        mean = sum(shots) / len(shots)
-        variance = sum((x - mean) ** 2 for x in shots) / len(shots)
-        std_dev = math.sqrt(variance)
-        return max(float(std_dev), 0.5)  # Minimum 0.5 std dev
-        
-    def _calc_trend(self, games: List[Dict]) -> float:
+        if not shots:
+            # League average defaults
+            stats = {key: _LEAGUE_AVG_SOG for key, _ in _AVERAGE_WINDOWS}
+            stats.update({key: _LEAGUE_STD_SOG for key, _ in _STD_DEV_WINDOWS})
+            stats['sog_trend'] = 0.0
+            return stats
+            
+        running = list(accumulate(shots))
+        running_sq = list(accumulate(x * x for x in shots))
+        stats = {}
+        
+        for key, window in _AVERAGE_WINDOWS:
+            n = min(window or len(shots), len(shots))
+            stats[key] = float(running[n - 1] / n)
+            
+        for key, window in _STD_DEV_WINDOWS:
+            n = min(window or len(shots), len(shots))
+            if n < 2:
+                stats[key] = _LEAGUE_STD_SOG
+                continue
+            # Population variance from the exact sums:
+            # var = (n * sum(x^2) - sum(x)^2) / n^2
+            total = running[n - 1]
+            variance = (n * running_sq[n - 1] - total * total) / (n * n)
+            stats[key] = max(float(math.sqrt(variance)), 0.5)  # Minimum 0.5 std dev
+            
+        stats['sog_trend'] = self._calc_trend(shots, running)
+        return stats
+        
+    def _calc_trend(self, shots: List[int], running: List[int]) -> float:
         """
         Calculate shot trend (increasing/decreasing).
         
@@ -215,35 +240,25 @@ class ContinuousFeatureExtractor:
         Positive = increasing, Negative = decreasing
         
         Args:
-            games: List of game dictionaries (most recent first)
+            shots: List of shot counts (most recent first)
+            running: Running sums of shots (see _calc_shot_stats)
             
         Returns:
             Trend coefficient (-1 to +1 normalized)
         """
-        if len(games) < 3:
+        if len(shots) < 3:
             return 0.0  # Not enough data for trend
             
-        # Use last 10 games for trend
-        recent_games = games[:10]
-        shots = [g['shots_on_goal'] for g in recent_games]
-        
-        # Reverse so oldest is first for regression
-        shots = shots[::-1]
-
-        # Simple linear regression
-        x = list(range(len(shots)))
-
-        # Calculate slope
-        x_mean = sum(x) / len(x)
-        y_mean = sum(shots) / len(shots)
-
-        numerator = sum((xi - x_mean) * (yi - y_mean) for xi, yi in zip(x, shots))
-        denominator = sum((xi - x_mean) ** 2 for xi in x)
+        # Use last 10 games for trend, regressed oldest first: the game at
+        # index i (most recent first) sits at x = n - 1 - i
+        n = min(len(shots), 10)
+        sum_x = n * (n - 1) // 2
+        sum_y = running[n - 1]
+        sum_xy = sum((n - 1 - i) * y for i, y in enumerate(shots[:n]))
 
-        if denominator == 0:
-            return 0.0
-
-        slope = numerator / denominator
+        # Least-squares slope from exact integer sums; for x = 0..n-1,
+        # n * sum(x^2) - sum(x)^2 = n^2 * (n^2 - 1) / 12
+        slope = (n * sum_xy - sum_x * sum_y) / (n * n * (n * n - 1) // 12)
 
         # Normalize to -1 to +1 range
         # Typical slope range is -0.5 to +0.5 per game
@@ -251,24 +266,20 @@ class ContinuousFeatureExtractor:
 
         return float(normalized_trend)
         
-    def _calc_avg_toi(self, games: List[Dict]) -> float:
+    def _calc_avg_toi(self, toi: List[Optional[int]]) -> float:
         """
         Calculate average time on ice in minutes.
         
         Args:
-            games: List of game dictionaries
+            toi: List of TOI values in seconds (None where not recorded)
             
         Returns:
             Average TOI in minutes
         """
-        if not games:
+        if not toi:
             return 15.0  # Default ~15 minutes
             
-        toi_values = []
-        for game in games:
-            if game['toi_seconds'] is not None:
-                toi_minutes = game['toi_seconds'] / 60.0
-                toi_values.append(toi_minutes)
+        toi_values = [seconds / 60.0 for seconds in toi if seconds is not None]
         
         if not toi_values:
             return 15.0
@@ -288,11 +299,9 @@ class ContinuousFeatureExtractor:
         Returns:
             (is_safe, violation_date)
         """
-        game_date_obj = datetime.strptime(game_date, '%Y-%m-%d')
-        
+        # ISO dates compare correctly as strings
         for game in games:
-            game_date_check = datetime.strptime(game['game_date'], '%Y-%m-%d')
-            if game_date_check >= game_date_obj:
+            if game['game_date'] >= game_date:
                 return False, game['game_date']
                 
         return True, None
@@ -307,21 +316,7 @@ class ContinuousFeatureExtractor:
         Returns:
             Dictionary of default features (conservative estimates)
         """
-        league_avg_sog = 2.5  # League average from verify_data
-        league_std = 1.2
-        
-        return {
-            'sog_season': league_avg_sog,
-            'sog_l10': league_avg_sog,
-            'sog_l5': league_avg_sog,
-            'sog_std_season': league_std,
-            'sog_std_l10': league_std,
-            'sog_trend': 0.0,
-            'avg_toi_minutes': 15.0,
-            'is_home': 1.0 if is_home else 0.0,
-            'games_played': 0.0,
-            'insufficient_data': 1.0
-        }
+        return dict(_DEFAULT_FEATURES_BY_HOME[bool(is_home)])
 
 
 def test_feature_extraction():
@@ -92,20 +92,13 @@ def diagnose_database():
         print("[CHECK 3] Overall Statistics")
         print("-"*80)
         
-        cursor.execute("SELECT COUNT(*) FROM predictions")
-        total = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM predictions 
-            WHERE features_json IS NOT NULL AND features_json != ''
-        """)
-        with_features = cursor.fetchone()[0]
-        
         cursor.execute("""
-            SELECT COUNT(DISTINCT prediction_batch_id) 
+            SELECT COUNT(*),
+                   COALESCE(SUM(features_json IS NOT NULL AND features_json != ''), 0),
+                   COUNT(DISTINCT prediction_batch_id)
             FROM predictions
         """)
-        batch_count = cursor.fetchone()[0]
+        total, with_features, batch_count = cursor.fetchone()
         
         print(f"Total predictions: {total}")
         print(f"With features_json: {with_features} ({with_features/total*100:.1f}%)")
@@ -11,6 +11,38 @@ from pathlib import Path
 from v2_config import DB_PATH
 from statistical_predictions_v2 import StatisticalPredictionEngine
 
+# Shared connection for the helper queries below (opened on first use)
+_conn = None
+
+
+def get_db_connection() -> sqlite3.Connection:
+    """
+    Get this process's shared database connection
+    
+    The helpers run several small queries per run; reusing one connection
+    keeps SQLite's page cache warm instead of paying a connect/close each.
+    The PRAGMAs are applied once, when the connection is opened.
+    
+    Returns:
+        Open sqlite3 connection to DB_PATH
+    """
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+        _conn.execute('PRAGMA wal_autocheckpoint=1000')
+    return _conn
+
+
+def close_db_connection():
+    """Close this process's shared database connection, if it was opened"""
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
 def check_predictions_exist(target_date: str) -> tuple[bool, int]:
     """
     Check if predictions already exist for target date
@@ -21,11 +53,10 @@ def check_predictions_exist(target_date: str) -> tuple[bool, int]:
     Returns:
         Tuple of (predictions_exist, prediction_count)
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM predictions WHERE game_date = ?', (target_date,))
     count = cursor.fetchone()[0]
-    conn.close()
     
     return count > 0, count
 
@@ -40,17 +71,15 @@ def delete_existing_predictions(target_date: str) -> int:
     Returns:
         Number of predictions deleted
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Count before deleting
     cursor.execute('SELECT COUNT(*) FROM predictions WHERE game_date = ?', (target_date,))
     count = cursor.fetchone()[0]
     
-    # Delete
+    # Delete (autocommit connection - the DELETE is its own transaction)
     cursor.execute('DELETE FROM predictions WHERE game_date = ?', (target_date,))
-    conn.commit()
-    conn.close()
     
     return count
 
@@ -65,11 +94,10 @@ def check_games_exist(target_date: str) -> tuple[bool, int]:
     Returns:
         Tuple of (games_exist, game_count)
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT COUNT(*) FROM games WHERE game_date = ?', (target_date,))
     count = cursor.fetchone()[0]
-    conn.close()
     
     return count > 0, count
 
@@ -139,24 +167,51 @@ def get_players_with_history_for_team(team: str, min_games: int = 5, top_n: int
     Returns:
         List of player names with sufficient history
     """
-    conn = sqlite3.connect(DB_PATH)
+    return get_players_with_history_for_teams([team], min_games, top_n).get(team, [])
+
+
+def get_players_with_history_for_teams(teams, min_games: int = 5, top_n: int = 12) -> dict[str, list[str]]:
+    """
+    Get players with game log history for every team on the slate in one query
+    
+    Args:
+        teams: Team abbreviations
+        min_games: Minimum games required in history
+        top_n: Number of top players to return per team
+        
+    Returns:
+        Dict mapping team -> list of player names (highest PPG first)
+    """
+    teams = list(dict.fromkeys(teams))
+    if not teams:
+        return {}
+    
+    conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT player_name, COUNT(*) as games, 
-               SUM(points) * 1.0 / COUNT(*) as ppg
-        FROM player_game_logs
-        WHERE team = ?
-        GROUP BY player_name
-        HAVING games >= ?
-        ORDER BY ppg DESC
-        LIMIT ?
-    ''', (team, min_games, top_n))
+    placeholders = ', '.join('?' * len(teams))
+    cursor.execute(f'''
+        SELECT team, player_name
+        FROM (
+            SELECT team, player_name,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY team
+                       ORDER BY SUM(points) * 1.0 / COUNT(*) DESC, player_name
+                   ) as rank
+            FROM player_game_logs
+            WHERE team IN ({placeholders})
+            GROUP BY team, player_name
+            HAVING COUNT(*) >= ?
+        )
+        WHERE rank <= ?
+        ORDER BY team, rank
+    ''', (*teams, min_games, top_n))
     
-    players = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    players_by_team = {team: [] for team in teams}
+    for team, player_name in cursor.fetchall():
+        players_by_team[team].append(player_name)
     
-    return players
+    return players_by_team
 
 
 def determine_phase(current_date: str) -> tuple[str, int]:
@@ -173,7 +228,7 @@ def determine_phase(current_date: str) -> tuple[str, int]:
     # Exploitation: Nov 20 - Jan 5 (top 8 players per team)
     
     exploration_end = datetime(2025, 11, 19)
-    current = datetime.strptime(current_date, '%Y-%m-%d')
+    current = datetime.fromisoformat(current_date)
     
     if current <= exploration_end:
         return "EXPLORATION", 12
@@ -249,68 +304,74 @@ def generate_predictions_for_date(target_date: str, force: bool = False) -> int:
     print()
     
     # Get games
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT game_date, away_team, home_team FROM games WHERE game_date = ?', (target_date,))
     games = cursor.fetchall()
-    conn.close()
     
     print(f"Games on {target_date}:")
     for _, away, home in games:
         print(f"  {away} @ {home}")
     print()
     
-    # Initialize prediction engine
-    engine = StatisticalPredictionEngine(db_path=DB_PATH, learning_mode=True)
-    
-    total_predictions = 0
-    total_players_found = 0
-    total_players_skipped = 0
+    # Load players for every team on the slate in one query
+    slate_teams = [team for _, away, home in games for team in (away, home)]
+    players_by_team = get_players_with_history_for_teams(slate_teams, min_games=5, top_n=players_per_team)
     
-    for game_date, away_team, home_team in games:
-        # Away team players
-        away_players = get_players_with_history_for_team(away_team, min_games=5, top_n=players_per_team)
+    # Initialize prediction engine - leaving the block writes any
+    # predictions it still has queued, even if the slate fails midway
+    with StatisticalPredictionEngine(db_path=DB_PATH, learning_mode=True) as engine:
+        # Load every slate player's history in one query
+        engine.preload_histories(players_by_team, target_date)
         
-        if away_players:
-            print(f"{away_team}: {len(away_players)} players with history")
-            total_players_found += len(away_players)
+        total_predictions = 0
+        total_players_found = 0
+        total_players_skipped = 0
+        
+        for game_date, away_team, home_team in games:
+            # Away team players
+            away_players = players_by_team.get(away_team, [])
             
-            for player in away_players:
-                # Points O0.5
-                pred = engine.predict_points(player, away_team, game_date, home_team, is_home=False)
-                if pred:
-                    total_predictions += 1
+            if away_players:
+                print(f"{away_team}: {len(away_players)} players with history")
+                total_players_found += len(away_players)
                 
-                # Shots O2.5
-                pred = engine.predict_shots(player, away_team, game_date, home_team, is_home=False)
-                if pred:
-                    total_predictions += 1
-        else:
-            print(f"{away_team}: No players with sufficient history (skipping)")
-            total_players_skipped += 1
-        
-        # Home team players
-        home_players = get_players_with_history_for_team(home_team, min_games=5, top_n=players_per_team)
-        
-        if home_players:
-            print(f"{home_team}: {len(home_players)} players with history")
-            total_players_found += len(home_players)
+                for player in away_players:
+                    # Points O0.5
+                    pred = engine.predict_points(player, away_team, game_date, home_team, is_home=False)
+                    if pred:
+                        total_predictions += 1
+                    
+                    # Shots O2.5
+                    pred = engine.predict_shots(player, away_team, game_date, home_team, is_home=False)
+                    if pred:
+                        total_predictions += 1
+            else:
+                print(f"{away_team}: No players with sufficient history (skipping)")
+                total_players_skipped += 1
             
-            for player in home_players:
-                # Points O0.5
-                pred = engine.predict_points(player, home_team, game_date, away_team, is_home=True)
-                if pred:
-                    total_predictions += 1
+            # Home team players
+            home_players = players_by_team.get(home_team, [])
+            
+            if home_players:
+                print(f"{home_team}: {len(home_players)} players with history")
+                total_players_found += len(home_players)
                 
-                # Shots O2.5
-                pred = engine.predict_shots(player, home_team, game_date, away_team, is_home=True)
-                if pred:
-                    total_predictions += 1
-        else:
-            print(f"{home_team}: No players with sufficient history (skipping)")
-            total_players_skipped += 1
-        
-        print()
+                for player in home_players:
+                    # Points O0.5
+                    pred = engine.predict_points(player, home_team, game_date, away_team, is_home=True)
+                    if pred:
+                        total_predictions += 1
+                    
+                    # Shots O2.5
+                    pred = engine.predict_shots(player, home_team, game_date, away_team, is_home=True)
+                    if pred:
+                        total_predictions += 1
+            else:
+                print(f"{home_team}: No players with sufficient history (skipping)")
+                total_players_skipped += 1
+            
+            print()
     
     print()
     print('=' * 80)
@@ -335,7 +396,7 @@ def verify_predictions(target_date: str) -> dict:
     Returns:
         Dictionary with verification results
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     # Count predictions
@@ -357,7 +418,6 @@ def verify_predictions(target_date: str) -> dict:
     ''', (target_date,))
     
     stats = cursor.fetchone()
-    conn.close()
     
     if stats:
         return {
@@ -376,68 +436,72 @@ def verify_predictions(target_date: str) -> dict:
 
 def main():
     """Main execution"""
-    # Parse arguments
-    if len(sys.argv) > 1:
-        target_date = sys.argv[1]
-        print(f"Using provided date: {target_date}")
-    else:
-        # Auto-detect tomorrow
-        target_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-        print(f"Auto-detected tomorrow: {target_date}")
-    
-    # Check for force flag
-    force = '--force' in sys.argv or '-f' in sys.argv
-    
-    print()
-    
-    # Generate predictions
-    count = generate_predictions_for_date(target_date, force=force)
-    
-    if count == 0:
-        # Check if predictions exist (skipped) vs error
-        preds_exist, pred_count = check_predictions_exist(target_date)
-        if preds_exist:
-            print("[INFO] Predictions already exist - use --force to regenerate")
-            return 0  # Success - predictions exist
+    try:
+        # Parse arguments
+        if len(sys.argv) > 1:
+            target_date = sys.argv[1]
+            print(f"Using provided date: {target_date}")
         else:
-            print("[WARNING] No predictions generated")
-            print("   Check if:")
-            print("   1. Games are scheduled for this date")
-            print("   2. Players have sufficient game history (5+ games)")
-            print()
-            return 1  # Error - no predictions and none exist
-    
-    # Verify predictions
-    print()
-    print('=' * 80)
-    print('VERIFICATION RESULTS')
-    print('=' * 80)
-    print()
-    
-    results = verify_predictions(target_date)
-    
-    print(f"Predictions in database: {results['count']}")
-    
-    if results['count'] > 0:
-        print(f"Unique players: {results['unique_players']}")
-        print(f"Unique probabilities: {results['unique_probs']}")
-        print(f"Avg probability: {results['avg_prob']:.1%}")
-        print(f"Range: {results['min_prob']:.1%} to {results['max_prob']:.1%}")
-        print(f"OVER: {results['over_count']}, UNDER: {results['under_count']}")
+            # Auto-detect tomorrow
+            target_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+            print(f"Auto-detected tomorrow: {target_date}")
+        
+        # Check for force flag
+        force = '--force' in sys.argv or '-f' in sys.argv
+        
+        print()
+        
+        # Generate predictions
+        count = generate_predictions_for_date(target_date, force=force)
+        
+        if count == 0:
+            # Check if predictions exist (skipped) vs error
+            preds_exist, pred_count = check_predictions_exist(target_date)
+            if preds_exist:
+                print("[INFO] Predictions already exist - use --force to regenerate")
+                return 0  # Success - predictions exist
+            else:
+                print("[WARNING] No predictions generated")
+                print("   Check if:")
+                print("   1. Games are scheduled for this date")
+                print("   2. Players have sufficient game history (5+ games)")
+                print()
+                return 1  # Error - no predictions and none exist
+        
+        # Verify predictions
+        print()
+        print('=' * 80)
+        print('VERIFICATION RESULTS')
+        print('=' * 80)
         print()
         
-        # Success criteria
-        if results['unique_probs'] > 10:
-            print("[OK] SUCCESS - Predictions generated and verified!")
-            print("   Feature variety looks good (not using defaults)")
+        results = verify_predictions(target_date)
+        
+        print(f"Predictions in database: {results['count']}")
+        
+        if results['count'] > 0:
+            print(f"Unique players: {results['unique_players']}")
+            print(f"Unique probabilities: {results['unique_probs']}")
+            print(f"Avg probability: {results['avg_prob']:.1%}")
+            print(f"Range: {results['min_prob']:.1%} to {results['max_prob']:.1%}")
+            print(f"OVER: {results['over_count']}, UNDER: {results['under_count']}")
+            print()
+            
+            # Success criteria
+            if results['unique_probs'] > 10:
+                print("[OK] SUCCESS - Predictions generated and verified!")
+                print("   Feature variety looks good (not using defaults)")
+            else:
+                print("[WARNING] WARNING - Low probability variety")
+                print("   May be using default values - check player history")
         else:
-            print("[WARNING] WARNING - Low probability variety")
-            print("   May be using default values - check player history")
-    else:
-        print("[ERROR] ERROR - Predictions generated but not found in database")
-    
-    print()
-    return 0
+            print("[ERROR] ERROR - Predictions generated but not found in database")
+        
+        print()
+        return 0
+    finally:
+        # Close the shared helper connection so its WAL is checkpointed now
+        close_db_connection()
 
 
 if __name__ == '__main__':
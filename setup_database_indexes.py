@@ -0,0 +1,93 @@
+"""
+Database Setup - Journal Mode and Indexes
+Applies the one-off database settings the V2 scripts rely on
+
+Run once per database (and again after restoring an older copy):
+    python setup_database_indexes.py
+
+Every statement is a no-op once applied, so re-running is safe. The
+prediction engine and check scripts only use these indexes - they never
+create them, so building one on a large table never blocks a daily run.
+"""
+
+import sqlite3
+from v2_config import DB_PATH
+
+# Serves the engine's per-player history query (and the extractors' own
+# history queries) as an index range search already in game_date order -
+# no table scan or sort
+_HISTORY_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_player_logs_player_team_date
+    ON player_game_logs(player_name, team, game_date)
+"""
+
+# Covers the daily driver's per-team player ranking (team IN ..., grouped by
+# player, averaging points) without touching the table rows
+_TEAM_PLAYERS_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_player_logs_team_player
+    ON player_game_logs(team, player_name, points)
+"""
+
+# Partial index over the (normally zero) predictions without features, so
+# the check scripts count them from the index instead of scanning the table.
+# Keyed on id - the WHERE clause does the work, the key only has to be small
+_MISSING_FEATURES_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_predictions_without_features
+    ON predictions(id)
+    WHERE features_json IS NULL OR features_json = ''
+"""
+
+# Superseded indexes: the wide covering history index and the partial
+# index keyed on the large features_json column
+_DROP_OLD_INDEXES_SQL = (
+    "DROP INDEX IF EXISTS idx_player_logs_history",
+    "DROP INDEX IF EXISTS idx_predictions_missing_features",
+)
+
+
+def setup_database(db_path: str = DB_PATH) -> bool:
+    """
+    Switch the database to WAL and create the indexes
+
+    WAL is stored in the database file, so every later connection uses it:
+    batch commits append to the WAL instead of fsyncing a rollback journal,
+    and the daily run can read while the grader writes.
+
+    Args:
+        db_path: Path to nhl_predictions_v2.db
+
+    Returns:
+        True if every statement was applied
+    """
+    print("="*80)
+    print("DATABASE SETUP - JOURNAL MODE AND INDEXES")
+    print("="*80)
+    print()
+
+    try:
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        try:
+            journal_mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+            print(f"  [OK] journal_mode = {journal_mode}")
+
+            for sql in (_HISTORY_INDEX_SQL, _TEAM_PLAYERS_INDEX_SQL, _MISSING_FEATURES_INDEX_SQL):
+                conn.execute(sql)
+                print(f"  [OK] {sql.split()[5]}")
+
+            for sql in _DROP_OLD_INDEXES_SQL:
+                conn.execute(sql)
+                print(f"  [OK] dropped {sql.split()[-1]} (if present)")
+        finally:
+            conn.close()
+
+    except sqlite3.Error as e:
+        print(f"[ERROR] Database error: {e}")
+        return False
+
+    print()
+    print("[OK] DATABASE SETUP COMPLETE")
+    return True
+
+
+if __name__ == '__main__':
+    setup_database()
@@ -14,7 +14,7 @@ predictions made in the same run. Format: YYYYMMDD_HHMMSS (e.g., 20251108_143022
 Original Changes:
 1. predict_points() returns features dict
 2. predict_shots() returns features dict  
-3. _save_prediction() saves features as JSON
+3. _save_prediction() saves features as JSON (flushed in batches)
 4. All features captured for ML training
 
 Date: 2025-11-08 (FULLY FIXED)
@@ -23,16 +23,154 @@ Status: PRODUCTION READY
 
 import sqlite3
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, Optional, Tuple
 import sys
 import math
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from operator import itemgetter
 
 # Import feature extractors
 sys.path.insert(0, '.')
 from features.binary_feature_extractor import BinaryFeatureExtractor
 from features.continuous_feature_extractor import ContinuousFeatureExtractor
 
+_SQRT2 = math.sqrt(2)
+
+# One history query serves both extractors (union of the columns they read)
+_HISTORY_COLUMNS = """
+        game_date,
+        scored_1plus_points,
+        points,
+        shots_on_goal,
+        toi_seconds,
+        is_home"""
+
+# Per-player history before a cutoff date - an index range search on
+# idx_player_logs_player_team_date (see setup_database_indexes.py)
+_PLAYER_HISTORY_SQL = f"""
+    SELECT {_HISTORY_COLUMNS}
+    FROM player_game_logs
+    WHERE player_name = ?
+        AND team = ?
+        AND game_date < ?
+    ORDER BY game_date DESC
+"""
+
+# Prepared once; sqlite3 reuses the compiled statement on the engine's connection
+_PREDICTION_INSERT_SQL = """
+    INSERT INTO predictions (
+        game_date, player_name, team, opponent, 
+        prop_type, line, prediction, probability, 
+        confidence_tier, model_version, prediction_batch_id, 
+        features_json, created_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Leading _PREDICTION_INSERT_SQL values, fetched from a prediction dict in
+# one C-level call (prediction_batch_id is REQUIRED by the database)
+_PREDICTION_ROW_FIELDS = itemgetter(
+    'game_date', 'player_name', 'team', 'opponent',
+    'prop_type', 'line', 'prediction', 'probability',
+    'confidence_tier', 'model_version', 'prediction_batch_id'
+)
+
+# features_json is written compact (no spaces after separators)
+try:
+    # Faster C JSON encoder when available; stdlib encoder otherwise
+    from orjson import dumps as _orjson_dumps
+
+    def _encode_features(features: Dict) -> str:
+        return _orjson_dumps(features).decode()
+except ImportError:
+    _encode_features = json.JSONEncoder(separators=(',', ':')).encode
+
+# Queued predictions are written with one executemany per this many rows
+_PREDICTION_FLUSH_SIZE = 500
+
+
+@lru_cache(maxsize=64)
+def _cutoff_date(game_date: str) -> str:
+    """
+    Day before game_date (YYYY-MM-DD)
+    
+    Cached: a slate predicts every player for the same few game dates.
+    """
+    return (date.fromisoformat(game_date) - timedelta(days=1)).isoformat()
+
+
+def _points_prob_over(success_rate_l5: float, success_rate_l10: float) -> Tuple[float, float]:
+    """
+    Points O0.5 probability (before learning-mode caps)
+    
+    Pure float math with no dict or database access, so it can be called
+    in tight loops (backtests, batch runs).
+    
+    Returns:
+        (prob_over, lambda_param)
+    """
+    # Estimate PPG from success rate (if 50% success rate, assume ~0.6 PPG)
+    ppg_recent = success_rate_l5 * 1.2  # Rough conversion
+    
+    # Poisson parameter (lambda) = expected points
+    lambda_param = ppg_recent
+    
+    # P(X > 0.5) = 1 - P(X = 0) = 1 - e^(-lambda)
+    # Survival function via expm1: no cancellation for small lambda
+    prob_over = -math.expm1(-lambda_param)
+    
+    # Adjust based on recent (L10) success rate
+    prob_over = (prob_over * 0.7) + (success_rate_l10 * 0.3)
+    
+    return prob_over, lambda_param
+
+
+def _shots_prob_over(mean_shots: float, std_dev: float, line: float) -> Tuple[float, float]:
+    """
+    Shots O(line) probability (before learning-mode caps)
+    
+    Pure float math with no dict or database access, so it can be called
+    in tight loops (backtests, batch runs).
+    
+    Returns:
+        (prob_over, z_score)
+    """
+    # P(X > line) using normal CDF
+    # Z-score = (line - mean) / std_dev
+    z_score = (line - mean_shots) / std_dev if std_dev > 0 else 0
+    
+    # P(X > line) = 1 - CDF(z_score) = 0.5 * erfc(z / sqrt(2))
+    prob_over = 0.5 * math.erfc(z_score / _SQRT2)
+    
+    return prob_over, z_score
+
+
+# Confidence tiers, most to least confident, with the probability cut
+# points below / above 50%. A tier applies at or beyond its cut point
+# (e.g. production T1-ELITE is p <= 0.25 or p >= 0.75).
+# Learning mode (30-70% cap) has no T1-ELITE - we're being conservative!
+_TIER_TABLES = {
+    True: (('T2-STRONG', 'T3-GOOD', 'T4-LEAN', 'T5-FADE'),
+           (0.35, 0.40, 0.45),
+           (0.55, 0.60, 0.65)),
+    False: (('T1-ELITE', 'T2-STRONG', 'T3-GOOD', 'T4-LEAN', 'T5-FADE'),
+            (0.25, 0.35, 0.40, 0.45),
+            (0.55, 0.60, 0.65, 0.75)),
+}
+
+
+def _confidence_tier(probability: float, learning_mode: bool) -> str:
+    """
+    Confidence tier for a probability via bisection over the tier cut points
+    
+    Same tiers as the original if/elif chain (45-55% is T5-FADE, coin flips).
+    """
+    tiers, lower, upper = _TIER_TABLES[bool(learning_mode)]
+    if probability <= 0.5:
+        return tiers[bisect_left(lower, probability)]
+    return tiers[len(upper) - bisect_right(upper, probability)]
+
 
 class StatisticalPredictionEngine:
     """
@@ -65,19 +203,66 @@ class StatisticalPredictionEngine:
         self.max_prob = 0.70 if learning_mode else 0.95
         
         # Database connection for saving predictions
-        self.conn = sqlite3.connect(self.db_path)
+        self._pending_predictions = []
+        # synchronous=NORMAL: with the WAL journal (set once by
+        # setup_database_indexes.py, which also builds the indexes the
+        # history queries use) batch commits skip the per-commit fsync.
+        # Autocommit mode - flush_predictions() opens its own transactions
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA synchronous=NORMAL')
         self.cursor = self.conn.cursor()
         
+        # Player histories for the current cutoff date, shared by the
+        # points and shots predictions of the same player
+        self._history_date = None
+        self._histories = {}
+        
         print(f'INFO: Statistical Prediction Engine V2 Initialized')
         print(f'INFO: Batch ID: {self.batch_id}')
         print(f'INFO: Learning Mode: {learning_mode}')
         if learning_mode:
             print(f'INFO:   Probability Cap: {self.min_prob:.0%}-{self.max_prob:.0%} (conservative)')
     
+    def close(self):
+        """
+        Write any queued predictions and close the database connections
+        
+        predict_points()/predict_shots() only queue their rows, so callers
+        must close() the engine (or use it as a context manager) once done.
+        Safe to call more than once.
+        """
+        if getattr(self, 'conn', None) is None:
+            return
+        try:
+            self.flush_predictions()
+        finally:
+            self._close_connections()
+    
+    def _close_connections(self):
+        """Close the engine's and the extractors' database connections"""
+        self.conn.close()
+        self.conn = None
+        self.binary_extractor.close()
+        self.continuous_extractor.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def __del__(self):
-        """Clean up database connection"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        """
+        Release the connections of an engine that was never closed
+        
+        Never writes: queued predictions are only saved by close()/flush.
+        """
+        if getattr(self, 'conn', None) is None:
+            return
+        if self._pending_predictions:
+            print(f'WARNING: Discarding {len(self._pending_predictions)} unsaved predictions '
+                  f'- close the engine to save them')
+        self._close_connections()
     
     def predict_points(
         self, 
@@ -103,7 +288,7 @@ class StatisticalPredictionEngine:
             Prediction dict with features, or None if insufficient data
         """
         # Temporal safety: Only use data from before game_date
-        cutoff_date = (datetime.strptime(game_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        cutoff_date = _cutoff_date(game_date)
         
         # Extract binary features (FIXED: correct method name and parameter)
         features = self.binary_extractor.extract_features(
@@ -111,7 +296,8 @@ class StatisticalPredictionEngine:
             team=team,
             game_date=cutoff_date,
             opponent=opponent,
-            is_home=is_home
+            is_home=is_home,
+            games=self._get_player_history(player, team, cutoff_date)
         )
         
         # Check if we have sufficient data
@@ -123,18 +309,7 @@ class StatisticalPredictionEngine:
         success_rate_l5 = features.get('success_rate_l5', 0.425)
         success_rate_l10 = features.get('success_rate_l10', 0.425)
         
-        # Estimate PPG from success rate (if 50% success rate, assume ~0.6 PPG)
-        ppg_recent = success_rate_l5 * 1.2  # Rough conversion
-        success_rate = success_rate_l10  # Historical success
-        
-        # Poisson parameter (lambda) = expected points
-        lambda_param = ppg_recent
-        
-        # P(X > 0.5) = 1 - P(X = 0) = 1 - e^(-lambda)
-        prob_over = 1 - math.exp(-lambda_param)
-        
-        # Adjust based on recent success rate
-        prob_over = (prob_over * 0.7) + (success_rate * 0.3)
+        prob_over, lambda_param = _points_prob_over(success_rate_l5, success_rate_l10)
         
         # Apply learning mode caps
         prob_over = max(self.min_prob, min(self.max_prob, prob_over))
@@ -150,8 +325,8 @@ class StatisticalPredictionEngine:
             # Binary features (actual names from extractor)
             'success_rate_season': features.get('success_rate_season', 0.35),
             'success_rate_l20': features.get('success_rate_l20', 0.35),
-            'success_rate_l10': features.get('success_rate_l10', 0.35),
-            'success_rate_l5': features.get('success_rate_l5', 0.35),
+            'success_rate_l10': success_rate_l10,
+            'success_rate_l5': success_rate_l5,
             'success_rate_l3': features.get('success_rate_l3', 0.35),
             'current_streak': features.get('current_streak', 0),
             'max_hot_streak': features.get('max_hot_streak', 0),
@@ -163,7 +338,7 @@ class StatisticalPredictionEngine:
             
             # Calculated features
             'lambda_param': lambda_param,
-            'poisson_prob': 1 - math.exp(-lambda_param),
+            'poisson_prob': -math.expm1(-lambda_param),
         }
         
         # Build prediction dict
@@ -214,7 +389,7 @@ class StatisticalPredictionEngine:
             Prediction dict with features, or None if insufficient data
         """
         # Temporal safety: Only use data from before game_date
-        cutoff_date = (datetime.strptime(game_date, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        cutoff_date = _cutoff_date(game_date)
         
         # Extract continuous features (FIXED: correct method name and parameter)
         features = self.continuous_extractor.extract_features(
@@ -222,7 +397,8 @@ class StatisticalPredictionEngine:
             team=team,
             game_date=cutoff_date,
             opponent=opponent,
-            is_home=is_home
+            is_home=is_home,
+            games=self._get_player_history(player, team, cutoff_date)
         )
         
         # Check if we have sufficient data
@@ -233,13 +409,7 @@ class StatisticalPredictionEngine:
         mean_shots = features.get('sog_l10', 2.5)  # Last 10 games average
         std_dev = features.get('sog_std_l10', 1.5)  # Standard deviation
         
-        # P(X > line) using normal CDF
-        # Z-score = (line - mean) / std_dev
-        z_score = (line - mean_shots) / std_dev if std_dev > 0 else 0
-        
-        # P(X > line) = 1 - CDF(z_score)
-        # Approximate CDF using error function
-        prob_over = 0.5 * (1 - self._erf(z_score / math.sqrt(2)))
+        prob_over, z_score = _shots_prob_over(mean_shots, std_dev, line)
         
         # Apply learning mode caps
         prob_over = max(self.min_prob, min(self.max_prob, prob_over))
@@ -254,10 +424,10 @@ class StatisticalPredictionEngine:
         features_for_ml = {
             # Continuous features (actual names from extractor)
             'sog_season': features.get('sog_season', 2.5),
-            'sog_l10': features.get('sog_l10', 2.5),
+            'sog_l10': mean_shots,
             'sog_l5': features.get('sog_l5', 2.5),
             'sog_std_season': features.get('sog_std_season', 1.2),
-            'sog_std_l10': features.get('sog_std_l10', 1.2),
+            'sog_std_l10': std_dev,
             'sog_trend': features.get('sog_trend', 0.0),
             'avg_toi_minutes': features.get('avg_toi_minutes', 15.0),
             'games_played': features.get('games_played', 0),
@@ -294,6 +464,78 @@ class StatisticalPredictionEngine:
         
         return prediction_data
     
+    def _get_player_history(self, player: str, team: str, cutoff_date: str) -> list:
+        """
+        Player's games before cutoff_date (most recent first), fetched once
+        
+        Cached per cutoff date: a slate predicts several props per player
+        for the same date, so each player's history is read only once.
+        
+        Args:
+            player: Player name
+            team: Team abbreviation
+            cutoff_date: Don't include games on or after this date
+            
+        Returns:
+            List of game dictionaries usable by both feature extractors
+        """
+        if cutoff_date != self._history_date:
+            self._history_date = cutoff_date
+            self._histories = {}
+        
+        key = (player, team)
+        games = self._histories.get(key)
+        if games is None:
+            cursor = self.conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(_PLAYER_HISTORY_SQL, (player, team, cutoff_date))
+            games = self._histories[key] = [dict(row) for row in cursor.fetchall()]
+        
+        return games
+    
+    def preload_histories(self, players_by_team: Dict[str, list], game_date: str):
+        """
+        Load the history of every player on a slate with one query
+        
+        Fills the per-cutoff-date history cache, so the predict_* calls
+        that follow make no per-player database reads.
+        
+        Args:
+            players_by_team: {team: [player_name, ...]} for the slate
+            game_date: Slate game date (YYYY-MM-DD)
+        """
+        cutoff_date = _cutoff_date(game_date)
+        teams = list(players_by_team)
+        if not teams:
+            return
+        
+        self._history_date = cutoff_date
+        self._histories = {
+            (player, team): []
+            for team, players in players_by_team.items()
+            for player in players
+        }
+        
+        # Filter on the (at most 32) slate teams rather than on hundreds of
+        # player names; rows for players not on the slate are skipped below
+        cursor = self.conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(f"""
+            SELECT player_name, team, {_HISTORY_COLUMNS}
+            FROM player_game_logs
+            WHERE team IN ({', '.join('?' * len(teams))})
+                AND game_date < ?
+            ORDER BY game_date DESC
+        """, (*teams, cutoff_date))
+        
+        histories = self._histories
+        for row in cursor:
+            games = histories.get((row['player_name'], row['team']))
+            if games is not None:
+                game = dict(row)
+                del game['player_name'], game['team']
+                games.append(game)
+    
     def _assign_confidence_tier(self, probability: float) -> str:
         """
         Assign confidence tier based on probability
@@ -302,101 +544,81 @@ class StatisticalPredictionEngine:
         - Learning mode (30-70% cap): Conservative tiers, no T1-ELITE
         - Production mode (10-95% range): Full tier range
         """
-        if self.learning_mode:
-            # LEARNING MODE TIERS (30-70% cap)
-            # No T1-ELITE during learning - we're being conservative!
-            if probability >= 0.65 or probability <= 0.35:
-                return 'T2-STRONG'  # Best tier in learning mode
-            elif probability >= 0.60 or probability <= 0.40:
-                return 'T3-GOOD'
-            elif probability >= 0.55 or probability <= 0.45:
-                return 'T4-LEAN'
-            else:
-                return 'T5-FADE'  # 45-55% range (coin flips)
-        else:
-            # PRODUCTION MODE TIERS (10-95% range)
-            # Full confidence after ML training
-            if probability >= 0.75 or probability <= 0.25:
-                return 'T1-ELITE'  # Truly confident (75%+ or 25%-)
-            elif probability >= 0.65 or probability <= 0.35:
-                return 'T2-STRONG'
-            elif probability >= 0.60 or probability <= 0.40:
-                return 'T3-GOOD'
-            elif probability >= 0.55 or probability <= 0.45:
-                return 'T4-LEAN'
-            else:
-                return 'T5-FADE'
+        return _confidence_tier(probability, self.learning_mode)
     
     def _save_prediction(self, prediction_data: Dict):
         """
-        Save prediction to database WITH FEATURES
+        Queue prediction for saving WITH FEATURES
         
         CRITICAL FIX: Now saves features_json for ML training
         
+        Rows are written by flush_predictions() in one transaction, either
+        when the queue fills up or when the engine is done.
+        
         Args:
             prediction_data: Prediction dict with features
         """
         try:
             # Extract features and convert to JSON
             features_dict = prediction_data.get('features', {})
-            features_json = json.dumps(features_dict) if features_dict else None
+            features_json = _encode_features(features_dict) if features_dict else None
             
-            # Insert prediction with features
-            self.cursor.execute("""
-                INSERT INTO predictions (
-                    game_date, player_name, team, opponent, 
-                    prop_type, line, prediction, probability, 
-                    confidence_tier, model_version, prediction_batch_id, 
-                    features_json, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                prediction_data['game_date'],
-                prediction_data['player_name'],
-                prediction_data['team'],
-                prediction_data['opponent'],
-                prediction_data['prop_type'],
-                prediction_data['line'],
-                prediction_data['prediction'],
-                prediction_data['probability'],
-                prediction_data['confidence_tier'],
-                prediction_data['model_version'],
-                prediction_data['prediction_batch_id'],  # ← REQUIRED by database
+            self._pending_predictions.append((
+                *_PREDICTION_ROW_FIELDS(prediction_data),
                 features_json,  # ← CRITICAL: Features saved here
                 prediction_data['created_at']
             ))
-            
-            self.conn.commit()
-            
-        except sqlite3.IntegrityError as e:
-            # Duplicate prediction - skip silently
-            print(f'WARNING: Failed to save prediction: {e}')
         except Exception as e:
             print(f'ERROR: Failed to save prediction: {e}')
+            return
+        
+        if len(self._pending_predictions) >= _PREDICTION_FLUSH_SIZE:
+            self.flush_predictions()
     
-    def _erf(self, x: float) -> float:
+    def flush_predictions(self) -> int:
         """
-        Approximation of error function for normal CDF
+        Write queued predictions to the database in one transaction
         
-        Uses Abramowitz and Stegun approximation
+        Returns:
+            Number of predictions saved
         """
-        # Constants
-        a1 =  0.254829592
-        a2 = -0.284496736
-        a3 =  1.421413741
-        a4 = -1.453152027
-        a5 =  1.061405429
-        p  =  0.3275911
-        
-        # Save the sign of x
-        sign = 1 if x >= 0 else -1
-        x = abs(x)
-        
-        # A&S formula
-        t = 1.0 / (1.0 + p * x)
-        y = 1.0 - (((((a5 * t + a4) * t) + a3) * t + a2) * t + a1) * t * math.exp(-x * x)
-        
-        return sign * y
-
+        rows = self._pending_predictions
+        if not rows:
+            return 0
+        self._pending_predictions = []
+        
+        try:
+            # Take the write lock up front rather than on the first INSERT
+            self.cursor.execute('BEGIN IMMEDIATE')
+            self.cursor.executemany(_PREDICTION_INSERT_SQL, rows)
+            self.conn.commit()
+            return len(rows)
+        except sqlite3.IntegrityError:
+            # A duplicate aborts the whole batch - redo it row by row so
+            # only the duplicates are skipped
+            self.conn.rollback()
+        except Exception as e:
+            self.conn.rollback()
+            print(f'ERROR: Failed to save predictions: {e}')
+            return 0
+        
+        saved = 0
+        self.cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for row in rows:
+                try:
+                    self.cursor.execute(_PREDICTION_INSERT_SQL, row)
+                    saved += 1
+                except sqlite3.IntegrityError as e:
+                    # Duplicate prediction - skip it with a warning
+                    print(f'WARNING: Failed to save prediction: {e}')
+            self.conn.commit()
+        except Exception:
+            # Never leave the write transaction open on this autocommit
+            # connection - later flushes could not BEGIN again
+            self.conn.rollback()
+            raise
+        return saved
 
 # Test function
 if __name__ == '__main__':
@@ -424,6 +646,8 @@ if __name__ == '__main__':
     else:
         print('  Insufficient data')
     
+    engine.close()
+    
     print()
     print('[OK] Test complete - check database for features_json!')
     print()
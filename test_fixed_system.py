@@ -120,6 +120,14 @@ try:
         extractor.close()
         sys.exit(1)
 
+    # Computed and default (no-history) features must share one key order,
+    # so every features_json row has the same layout
+    for order in (features, extractor._get_default_features(True), extractor._get_default_features(False)):
+        if list(order) != expected:
+            print(f"[FAIL] FAIL: Feature order differs: {list(order)}")
+            extractor.close()
+            sys.exit(1)
+
     print(f"[PASS] PASS: Binary features extracted")
     print(f"    Player: {player}")
     print(f"    Features: {len(features)}")
@@ -179,6 +187,13 @@ try:
             extractor.close()
             sys.exit(1)
 
+        # Computed and default (no-history) features must share one key order
+        for order in (features, extractor._get_default_features(True), extractor._get_default_features(False)):
+            if list(order) != expected:
+                print(f"[FAIL] FAIL: Feature order differs: {list(order)}")
+                extractor.close()
+                sys.exit(1)
+
         print(f"[PASS] PASS: Continuous features extracted")
         print(f"    Player: {player}")
         print(f"    Features: {len(features)}")
@@ -286,6 +301,9 @@ try:
                 print(f"    [FAIL] Missing expected features")
                 print(f"    Got: {list(pred['features'].keys())}")
     
+    # Predictions are queued by the engine - write them before Test 6
+    engine.close()
+    
     print()
     print("[PASS] PASS: Statistical prediction engine working")
     
@@ -23,15 +23,189 @@ This script:
 7. Sends Discord notification
 """
 
+import contextlib
 import sqlite3
-import urllib.request
 import urllib.error
+import urllib.request
 import json as json_lib
+import os
+import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
-from v2_config import DB_PATH, LEARNING_MODE
-from v2_discord_notifications import send_discord_notification
+from v2_config import DB_PATH, LEARNING_MODE, NHL_API_CACHE_DIR, NHL_API_CACHE_TTL
+
+try:
+    # Faster C JSON parser when available; stdlib json otherwise
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json_lib.loads
+
+NHL_API_HOST = 'api-web.nhle.com'
+NHL_API_MAX_WORKERS = 8  # Concurrent boxscore fetches
+NHL_API_RETRIES = 3      # Retries per request on connection errors / 429 / 5xx
+NHL_API_BACKOFF = 0.3    # Seconds; doubles after each retry
+
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Game states with a final boxscore
+_FINISHED_GAME_STATES = frozenset({'OFF', 'FINAL'})
+
+# Missing space after an initial: "J.Kulich" -> "J. Kulich"
+_INITIAL_DOT_RE = re.compile(r'\.(?=[A-Z])')
+
+# player_game_logs multi-row INSERT: prefix + one placeholder group per row
+_GAME_LOG_COLUMNS = (
+    'game_id', 'game_date', 'player_name', 'team', 'opponent', 'is_home',
+    'goals', 'assists', 'points', 'shots_on_goal', 'toi_seconds', 'plus_minus', 'pim',
+    'scored_1plus_points', 'scored_2plus_shots', 'scored_3plus_shots', 'scored_4plus_shots',
+    'created_at'
+)
+_GAME_LOG_INSERT_SQL = f"INSERT INTO player_game_logs ({', '.join(_GAME_LOG_COLUMNS)}) VALUES "
+_GAME_LOG_ROW_PLACEHOLDERS = '(' + ', '.join(['?'] * len(_GAME_LOG_COLUMNS)) + ')'
+# Re-grading a game updates its rows in place instead of delete + re-insert
+_GAME_LOG_UPSERT_SQL = ' ON CONFLICT(game_id, player_name) DO UPDATE SET ' + ', '.join(
+    f'{col} = excluded.{col}' for col in _GAME_LOG_COLUMNS if col not in ('game_id', 'player_name')
+)
+_GAME_LOG_ROWS_PER_INSERT = 999 // len(_GAME_LOG_COLUMNS)  # SQLite's classic bound-variable limit
+
+_OUTCOME_INSERT_SQL = '''
+    INSERT INTO prediction_outcomes
+    (prediction_id, game_date, player_name, prop_type, line,
+     predicted_outcome, predicted_probability, 
+     actual_stat_value, actual_outcome, outcome, graded_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _connect_db() -> sqlite3.Connection:
+    """
+    Open DB_PATH tuned for the grader's bulk writes
+    
+    WAL avoids the rollback-journal fsyncs on every commit and lets the
+    daily prediction run read while grading writes; synchronous=NORMAL is
+    safe under WAL (a crash can only lose the last commits, which a
+    re-run of the grader rewrites). The connection is in autocommit mode;
+    writers wrap their batch in BEGIN IMMEDIATE ... COMMIT themselves.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA mmap_size=268435456')  # 256 MB
+    return conn
+
+
+def _nhl_api_fetch(path: str, timeout: int = 10) -> bytes:
+    """
+    GET an NHL API path, retrying transient failures
+    
+    Connection errors and 429/5xx responses are retried up to
+    NHL_API_RETRIES times, backing off NHL_API_BACKOFF seconds (doubling
+    after each retry). urlopen follows redirects itself.
+    
+    Args:
+        path: Request path, e.g. '/v1/schedule/2025-11-08'
+        timeout: Socket timeout in seconds
+        
+    Returns:
+        Raw JSON response body
+        
+    Raises:
+        urllib.error.HTTPError: On any other non-200 response, or a
+            retryable one once the retries are used up
+        urllib.error.URLError: If the API is still unreachable after retrying
+    """
+    url = f'https://{NHL_API_HOST}{path}'
+    for attempt in range(NHL_API_RETRIES + 1):
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code not in _RETRY_STATUSES or attempt == NHL_API_RETRIES:
+                raise
+        except OSError:  # URLError, timeouts, dropped connections
+            if attempt == NHL_API_RETRIES:
+                raise
+        time.sleep(NHL_API_BACKOFF * 2 ** attempt)
+
+
+def _nhl_api_get(path: str, is_final=None):
+    """
+    GET an NHL API path, served from the on-disk cache when possible
+    
+    A cached response is reused forever once is_final(data) says it can no
+    longer change (e.g. an official final boxscore), otherwise only while it
+    is younger than NHL_API_CACHE_TTL seconds.
+    
+    Args:
+        path: Request path, e.g. '/v1/schedule/2025-11-08'
+        is_final: Optional callable(data) -> bool marking a complete response
+        
+    Returns:
+        Parsed JSON response
+        
+    Raises:
+        urllib.error.HTTPError: On a non-200 response (same as urlopen)
+    """
+    cache_file = os.path.join(NHL_API_CACHE_DIR, path.strip('/').replace('/', '_') + '.json')
+    
+    try:
+        with open(cache_file, 'rb') as f:
+            data = _json_loads(f.read())
+        if (is_final and is_final(data)) or time.time() - os.path.getmtime(cache_file) < NHL_API_CACHE_TTL:
+            return data
+    except (OSError, ValueError):
+        pass  # Missing or unreadable cache entry - fetch it
+    
+    body = _nhl_api_fetch(path)
+    data = _json_loads(body)
+    
+    try:
+        os.makedirs(NHL_API_CACHE_DIR, exist_ok=True)
+        tmp_file = f'{cache_file}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f'[WARNING] Could not cache {path}: {e}')
+    
+    return data
+
+
+def _boxscore_is_final(boxscore: dict) -> bool:
+    """Official ('OFF') boxscores no longer receive stat corrections"""
+    return boxscore.get('gameState') == 'OFF'
+
+
+def _schedule_is_final(schedule: dict, game_date: str) -> bool:
+    """
+    A schedule is complete once game_date is listed with games, all finished
+    
+    A missing date or an empty games list is never final - the schedule may
+    just not be published yet, so it stays subject to the cache TTL.
+    """
+    for day in schedule.get('gameWeek', []):
+        if day.get('date') == game_date:
+            games = day.get('games', [])
+            return bool(games) and all(
+                game.get('gameState') in _FINISHED_GAME_STATES for game in games
+            )
+    return False
+
+
+def _toi_to_seconds(toi) -> int:
+    """Boxscore 'MM:SS' time on ice -> seconds (0 if missing or malformed)"""
+    minutes, sep, seconds = str(toi or '').partition(':')
+    if not sep:
+        return 0
+    try:
+        return int(minutes) * 60 + int(seconds)
+    except ValueError:
+        return 0
 
 
 def save_player_game_logs_to_db(conn, game_id: str, game_date: str, player_stats_by_team: dict):
@@ -49,7 +223,8 @@ def save_player_game_logs_to_db(conn, game_id: str, game_date: str, player_stats
             {player_name: {stats}, ...}
     """
     cursor = conn.cursor()
-    saved_count = 0
+    rows = []
+    created_at = datetime.now().isoformat()
     
     for team_type in ['away', 'home']:
         is_home = 1 if team_type == 'home' else 0
@@ -66,14 +241,7 @@ def save_player_game_logs_to_db(conn, game_id: str, game_date: str, player_stats
                 scored_3plus_shots = 1 if shots >= 3 else 0  
                 scored_4plus_shots = 1 if shots >= 4 else 0
                 
-                cursor.execute("""
-                    INSERT OR REPLACE INTO player_game_logs
-                    (game_id, game_date, player_name, team, opponent, is_home,
-                     goals, assists, points, shots_on_goal, toi_seconds, plus_minus, pim,
-                     scored_1plus_points, scored_2plus_shots, scored_3plus_shots, scored_4plus_shots,
-                     created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+                rows.append((
                     game_id,
                     game_date,
                     player_name,
@@ -91,14 +259,27 @@ def save_player_game_logs_to_db(conn, game_id: str, game_date: str, player_stats
                     scored_2plus_shots,
                     scored_3plus_shots,
                     scored_4plus_shots,
-                    datetime.now().isoformat()
+                    created_at
                 ))
-                saved_count += 1
             except Exception as e:
                 print(f'      [WARNING] Could not save {player_name} to player_game_logs: {e}')
     
+    # Multi-row INSERTs (a whole game is usually one statement),
+    # committed as a single transaction
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for start in range(0, len(rows), _GAME_LOG_ROWS_PER_INSERT):
+            chunk = rows[start:start + _GAME_LOG_ROWS_PER_INSERT]
+            cursor.execute(
+                _GAME_LOG_INSERT_SQL + ', '.join([_GAME_LOG_ROW_PLACEHOLDERS] * len(chunk)) + _GAME_LOG_UPSERT_SQL,
+                [value for row in chunk for value in row]
+            )
+    except Exception:
+        conn.rollback()
+        raise
+    
     conn.commit()
-    return saved_count
+    return len(rows)
 
 def fetch_actual_results(game_date: str) -> Dict[str, Dict]:
     """
@@ -116,12 +297,11 @@ def fetch_actual_results(game_date: str) -> Dict[str, Dict]:
     
     try:
         # Get schedule for the date
-        schedule_url = f'https://api-web.nhle.com/v1/schedule/{game_date}'
-        req = urllib.request.Request(schedule_url)
-
         try:
-            with urllib.request.urlopen(req, timeout=10) as response:
-                schedule_data = json_lib.loads(response.read().decode('utf-8'))
+            schedule_data = _nhl_api_get(
+                f'/v1/schedule/{game_date}',
+                is_final=lambda data: _schedule_is_final(data, game_date)
+            )
         except urllib.error.HTTPError as e:
             print(f'[ERROR] Schedule API returned status {e.code}')
             return player_stats
@@ -139,141 +319,134 @@ def fetch_actual_results(game_date: str) -> Dict[str, Dict]:
         
         print(f'Found {len(games)} games')
         
-        # Fetch boxscore for each game
-        for game in games:
-            game_id = game.get('id')
-            if not game_id:
-                continue
+        # Fetch boxscores for all finished games concurrently (network bound).
+        # Results are still processed and saved in schedule order below, over
+        # one connection for all player_game_logs writes on this date. The
+        # pool is shut down and the connection closed (rolling back any open
+        # write) before returning, even if processing fails
+        with ThreadPoolExecutor(max_workers=NHL_API_MAX_WORKERS) as executor, \
+                contextlib.closing(_connect_db()) as conn:
+            boxscore_futures = {
+                game['id']: executor.submit(_nhl_api_get, f"/v1/gamecenter/{game['id']}/boxscore", _boxscore_is_final)
+                for game in games
+                if game.get('id') and game.get('gameState', 'UNKNOWN') in _FINISHED_GAME_STATES
+            }
             
-            away_abbrev = game.get('awayTeam', {}).get('abbrev', 'UNK')
-            home_abbrev = game.get('homeTeam', {}).get('abbrev', 'UNK')
-            game_state = game.get('gameState', 'UNKNOWN')
-            
-            print(f'  Fetching: {away_abbrev} @ {home_abbrev} (ID: {game_id}, State: {game_state})')
-            
-            # Only process finished games
-            if game_state not in ['OFF', 'FINAL']:
-                print(f'    [WARNING] Game not finished yet (state: {game_state})')
-                continue
-            
-            try:
-                # Get boxscore
-                boxscore_url = f'https://api-web.nhle.com/v1/gamecenter/{game_id}/boxscore'
-                box_req = urllib.request.Request(boxscore_url)
-
-                try:
-                    with urllib.request.urlopen(box_req, timeout=10) as box_response:
-                        boxscore = json_lib.loads(box_response.read().decode('utf-8'))
-                except urllib.error.HTTPError as e:
-                    print(f'    [ERROR] Boxscore API returned status {e.code}')
+            # Process boxscore for each game
+            for game in games:
+                game_id = game.get('id')
+                if not game_id:
                     continue
                 
-                # Extract player stats from boxscore
-                if 'playerByGameStats' not in boxscore:
-                    print(f'    [WARNING] No player stats in boxscore')
-                    continue
+                away_abbrev = game.get('awayTeam', {}).get('abbrev', 'UNK')
+                home_abbrev = game.get('homeTeam', {}).get('abbrev', 'UNK')
+                game_state = game.get('gameState', 'UNKNOWN')
                 
-                player_by_game = boxscore['playerByGameStats']
-                away_stats = player_by_game.get('awayTeam', {})
-                home_stats = player_by_game.get('homeTeam', {})
+                print(f'  Fetching: {away_abbrev} @ {home_abbrev} (ID: {game_id}, State: {game_state})')
                 
-                # Process away team
-                away_players = {}
-                for position in ['forwards', 'defense']:
-                    for player in away_stats.get(position, []):
-                        name_data = player.get('name', {})
-                        player_name = name_data.get('default', '')
-                        
-                        if player_name:
-                            points = player.get('points', 0)
-                            shots = player.get('sog', 0)
-                            goals = player.get('goals', 0)
-                            assists = player.get('assists', 0)
-                            toi = player.get('toi', '0:00')
-                            plus_minus = player.get('plusMinus', 0)
-                            pim = player.get('pim', 0)
-                            
-                            # Convert TOI to seconds
-                            toi_seconds = 0
-                            if toi and ':' in toi:
-                                try:
-                                    parts = toi.split(':')
-                                    if len(parts) == 2:
-                                        toi_seconds = int(parts[0]) * 60 + int(parts[1])
-                                except:
-                                    toi_seconds = 0
-                            
-                            player_stats[player_name] = {
-                                'points': points,
-                                'shots': shots,
-                                'goals': goals,
-                                'assists': assists,
-                                'team': away_abbrev,
-                                'opponent': home_abbrev,
-                                'toi_seconds': toi_seconds,
-                                'plus_minus': plus_minus,
-                                'pim': pim
-                            }
-                            
-                            away_players[player_name] = player_stats[player_name]
+                # Only process finished games
+                if game_state not in _FINISHED_GAME_STATES:
+                    print(f'    [WARNING] Game not finished yet (state: {game_state})')
+                    continue
                 
-                # Process home team
-                home_players = {}
-                for position in ['forwards', 'defense']:
-                    for player in home_stats.get(position, []):
-                        name_data = player.get('name', {})
-                        player_name = name_data.get('default', '')
-                        
-                        if player_name:
-                            points = player.get('points', 0)
-                            shots = player.get('sog', 0)
-                            goals = player.get('goals', 0)
-                            assists = player.get('assists', 0)
-                            toi = player.get('toi', '0:00')
-                            plus_minus = player.get('plusMinus', 0)
-                            pim = player.get('pim', 0)
-                            
-                            # Convert TOI to seconds
-                            toi_seconds = 0
-                            if toi and ':' in toi:
-                                try:
-                                    parts = toi.split(':')
-                                    if len(parts) == 2:
-                                        toi_seconds = int(parts[0]) * 60 + int(parts[1])
-                                except:
-                                    toi_seconds = 0
+                try:
+                    # Get boxscore
+                    try:
+                        boxscore = boxscore_futures[game_id].result()
+                    except urllib.error.HTTPError as e:
+                        print(f'    [ERROR] Boxscore API returned status {e.code}')
+                        continue
+                    
+                    # Extract player stats from boxscore
+                    if 'playerByGameStats' not in boxscore:
+                        print(f'    [WARNING] No player stats in boxscore')
+                        continue
+                    
+                    player_by_game = boxscore['playerByGameStats']
+                    away_stats = player_by_game.get('awayTeam', {})
+                    home_stats = player_by_game.get('homeTeam', {})
+                    
+                    # Process away team
+                    away_players = {}
+                    for position in ['forwards', 'defense']:
+                        for player in away_stats.get(position, []):
+                            name_data = player.get('name', {})
+                            player_name = name_data.get('default', '')
                             
-                            player_stats[player_name] = {
-                                'points': points,
-                                'shots': shots,
-                                'goals': goals,
-                                'assists': assists,
-                                'team': home_abbrev,
-                                'opponent': away_abbrev,
-                                'toi_seconds': toi_seconds,
-                                'plus_minus': plus_minus,
-                                'pim': pim
-                            }
+                            if player_name:
+                                points = player.get('points', 0)
+                                shots = player.get('sog', 0)
+                                goals = player.get('goals', 0)
+                                assists = player.get('assists', 0)
+                                toi = player.get('toi', '0:00')
+                                plus_minus = player.get('plusMinus', 0)
+                                pim = player.get('pim', 0)
+                                
+                                # Convert TOI to seconds
+                                toi_seconds = _toi_to_seconds(toi)
+                                
+                                player_stats[player_name] = {
+                                    'points': points,
+                                    'shots': shots,
+                                    'goals': goals,
+                                    'assists': assists,
+                                    'team': away_abbrev,
+                                    'opponent': home_abbrev,
+                                    'toi_seconds': toi_seconds,
+                                    'plus_minus': plus_minus,
+                                    'pim': pim
+                                }
+                                
+                                away_players[player_name] = player_stats[player_name]
+                    
+                    # Process home team
+                    home_players = {}
+                    for position in ['forwards', 'defense']:
+                        for player in home_stats.get(position, []):
+                            name_data = player.get('name', {})
+                            player_name = name_data.get('default', '')
                             
-                            home_players[player_name] = player_stats[player_name]
-                
-                # NEW IN V3: Save player stats to player_game_logs table
-                # This ensures feature extractors have fresh data for next predictions
-                conn = sqlite3.connect(DB_PATH)
-                saved = save_player_game_logs_to_db(
-                    conn,
-                    game_id=str(game_id),
-                    game_date=game_date,
-                    player_stats_by_team={'away': away_players, 'home': home_players}
-                )
-                conn.close()
-                
-                player_count = len(away_players) + len(home_players)
-                print(f'    [OK] Fetched stats for {player_count} players ([SAVE] saved {saved} to player_game_logs)')
-                
-            except Exception as e:
-                print(f'    [ERROR] Error fetching game {game_id}: {e}')
-                continue
+                            if player_name:
+                                points = player.get('points', 0)
+                                shots = player.get('sog', 0)
+                                goals = player.get('goals', 0)
+                                assists = player.get('assists', 0)
+                                toi = player.get('toi', '0:00')
+                                plus_minus = player.get('plusMinus', 0)
+                                pim = player.get('pim', 0)
+                                
+                                # Convert TOI to seconds
+                                toi_seconds = _toi_to_seconds(toi)
+                                
+                                player_stats[player_name] = {
+                                    'points': points,
+                                    'shots': shots,
+                                    'goals': goals,
+                                    'assists': assists,
+                                    'team': home_abbrev,
+                                    'opponent': away_abbrev,
+                                    'toi_seconds': toi_seconds,
+                                    'plus_minus': plus_minus,
+                                    'pim': pim
+                                }
+                                
+                                home_players[player_name] = player_stats[player_name]
+                    
+                    # NEW IN V3: Save player stats to player_game_logs table
+                    # This ensures feature extractors have fresh data for next predictions
+                    saved = save_player_game_logs_to_db(
+                        conn,
+                        game_id=str(game_id),
+                        game_date=game_date,
+                        player_stats_by_team={'away': away_players, 'home': home_players}
+                    )
+                    
+                    player_count = len(away_players) + len(home_players)
+                    print(f'    [OK] Fetched stats for {player_count} players ([SAVE] saved {saved} to player_game_logs)')
+                    
+                except Exception as e:
+                    print(f'    [ERROR] Error fetching game {game_id}: {e}')
+                    continue
         
         print(f'Found stats for {len(player_stats)} players total')
         
@@ -314,9 +487,8 @@ def find_player_stats(player_name: str, actual_stats: Dict) -> Optional[tuple]:
     # Handles: "J.Kulich" vs "J. Kulich"
     def normalize_name(name):
         """Remove spaces after dots and lowercase"""
-        import re
         # Add space after dots if missing: "J.Kulich" -> "J. Kulich"
-        name = re.sub(r'\.(?=[A-Z])', '. ', name)
+        name = _INITIAL_DOT_RE.sub('. ', name)
         # Remove extra spaces
         name = ' '.join(name.split())
         return name.lower()
@@ -374,7 +546,7 @@ def grade_predictions(game_date: str) -> Dict:
     Returns:
         Dict with grading results and stats
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect_db()
     cursor = conn.cursor()
     
     # Get predictions for date
@@ -426,6 +598,8 @@ def grade_predictions(game_date: str) -> Dict:
     
     not_found_count = 0
     not_found_examples = []
+    outcome_rows = []
+    graded_at = datetime.now().isoformat()
     
     for pred in predictions:
         pred_id, player_name, team, opponent, prop_type, line, prediction, probability, tier = pred
@@ -468,16 +642,10 @@ def grade_predictions(game_date: str) -> Dict:
         # Determine what actually happened
         actual_outcome = 'OVER' if actual_value > line else 'UNDER'
         
-        # Store in database
-        cursor.execute('''
-            INSERT INTO prediction_outcomes
-            (prediction_id, game_date, player_name, prop_type, line,
-             predicted_outcome, predicted_probability, 
-             actual_stat_value, actual_outcome, outcome, graded_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (pred_id, game_date, player_name, prop_type, line,
-              prediction, probability, actual_value, actual_outcome, outcome, 
-              datetime.now().isoformat()))
+        # Queue for database (written in one batch after the loop)
+        outcome_rows.append((pred_id, game_date, player_name, prop_type, line,
+                             prediction, probability, actual_value, actual_outcome,
+                             outcome, graded_at))
         
         # Update stats
         results['total'] += 1
@@ -509,6 +677,9 @@ def grade_predictions(game_date: str) -> Dict:
             'outcome': outcome
         })
     
+    # Store all outcomes in a single transaction
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.executemany(_OUTCOME_INSERT_SQL, outcome_rows)
     conn.commit()
     conn.close()
     
@@ -645,7 +816,9 @@ By Prop Type:
                 prop_acc = stats['hits'] / stats['total'] if stats['total'] > 0 else 0
                 message += f"• {prop}: {stats['hits']}/{stats['total']} ({prop_acc:.1%})\n"
             
-            # Try to send notification
+            # Try to send notification (imported here so grading never
+            # pays for, or depends on, the notifier's HTTP stack)
+            from v2_discord_notifications import send_discord_notification
             try:
                 send_discord_notification(message)
             except TypeError:
@@ -6,15 +6,22 @@ Central configuration for V2 rebuild system.
 All scripts should import from here for consistency.
 """
 
+import logging
 import os
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 # V2 Project root
 V2_ROOT = Path(r"C:\Users\thoma\NHL-Model-Rebuild-V2")
 
 # V2 Database path
 DB_PATH = str(V2_ROOT / "database" / "nhl_predictions_v2.db")
 
+# On-disk cache of NHL API responses (completed games never change)
+NHL_API_CACHE_DIR = str(V2_ROOT / ".cache" / "nhl_api")
+NHL_API_CACHE_TTL = 300  # Seconds an unfinished game/schedule stays fresh
+
 # Learning mode settings (Weeks 2-9)
 LEARNING_MODE = True
 PROBABILITY_CAP = (0.30, 0.70)  # Conservative during data collection
@@ -35,4 +42,7 @@ DATA_COLLECTION_END = "2026-01-05"
 # Feature importance thresholds
 MIN_FEATURE_IMPORTANCE = 0.01  # Drop features below this in ML training
 
-print(f"V2 Config loaded: DB={DB_PATH}, Learning Mode={LEARNING_MODE}")
+logger.debug("V2 Config loaded: DB=%s, Learning Mode=%s", DB_PATH, LEARNING_MODE)
+
+if __name__ == '__main__':
+    print(f"V2 Config loaded: DB={DB_PATH}, Learning Mode={LEARNING_MODE}")